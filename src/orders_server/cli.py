@@ -1,8 +1,24 @@
+import os
+import sys
+
 import uvicorn
 
 
 def main():
-    uvicorn.run("orders_server.main:app", host="127.0.0.1", port=8000, log_level="info")
+    # uvloop has no Windows build; use the stdlib loop there
+    loop = "asyncio" if sys.platform == "win32" else "uvloop"
+    uvicorn.run(
+        "orders_server.main:app",
+        host="127.0.0.1",
+        port=8000,
+        # Single process by default so the 20 req/sec limit is global. Each extra
+        # worker keeps its own limiter, so WORKERS=N allows up to 20*N req/sec.
+        workers=int(os.getenv("WORKERS", "1")),
+        log_level="warning",
+        access_log=False,
+        loop=loop,
+        http="httptools",
+    )
 
 
 if __name__ == "__main__":
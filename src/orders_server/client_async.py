@@ -1,84 +1,161 @@
 import asyncio
-import logging
 import csv
-from httpx import AsyncClient, RequestError, TimeoutException
-from aiolimiter import AsyncLimiter
+import io
+import logging
+import time
+from httpx import AsyncClient, Limits, RequestError, TimeoutException
 import aiofiles 
 
+from orders_server import retry
+from orders_server.log import start_logging
+from orders_server.models import FLAT_FIELDS as FIELDS
+
+try:
+    import uvloop
+except ImportError:  # no Windows build
+    uvloop = None
+
 MAX_RPS = 18      
 MAX_CONCURRENT = 50  
+BASE_URL = "http://127.0.0.1:8000"
 OUTPUT_FILE = "orders_async.csv"
-FIELDS = ["order_id","account_id","company","status","currency","subtotal","tax","total","created_at"]
+WRITE_BATCH = 128  # rows per write call
+
+logger = logging.getLogger(__name__)
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-)
+class TokenBucket:
+    """Rate limiter for a single event loop.
 
-async def fetch_item(client, item_id, limiter, semaphore, max_retries=3):
-    url = f"http://127.0.0.1:8000/item/{item_id}"
+    Each caller takes a token up front (the count may go negative) and then
+    sleeps once until that token has been refilled, so there is no waiter
+    queue and no per-task callback bookkeeping.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = rate if capacity is None else capacity
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+
+    async def __aenter__(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        self.tokens -= 1
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+    async def __aexit__(self, *exc):
+        return False
+
+async def fetch_item(client, item_id, limiter, max_retries=3):
+    # Flat form: just the CSV columns as a JSON array, in FIELDS order
+    url = f"/item/{item_id}?flat=1"
     retries = 0
 
-    async with semaphore: 
-        while retries < max_retries:
-            try:
-                async with limiter: 
-                    resp = await client.get(url, timeout=5.0)
-                    
-                if resp.status_code == 429: 
-                    retry_after = int(resp.headers.get("Retry-After", 1))
-                    logging.warning(f"{item_id} 429, retrying after {retry_after}s")
-                    await asyncio.sleep(retry_after)
-                    retries += 1
-                    continue
-                elif 500 <= resp.status_code < 600:  
-                    logging.warning(f"{item_id} {resp.status_code}, retrying in 1s")
-                    await asyncio.sleep(1)
-                    retries += 1
-                    continue
-                elif 400 <= resp.status_code < 500:
-                    logging.error(f"{item_id} {resp.status_code}, non-retryable")
-                    return None
+    while retries < max_retries:
+        try:
+            async with limiter: 
+                resp = await client.get(url, timeout=5.0)
                 
-                return resp.json()  
-            
-            except (RequestError, TimeoutException) as e:
-                logging.warning(f"{item_id} exception {e}, retrying...")
-                retries += 1
-                await asyncio.sleep(1)
+            action = retry.classify(resp)
+            if action is retry.OK:
+                return resp.json()
+            if action is retry.CLIENT_ERROR:
+                logger.error("%s %d, non-retryable", item_id, resp.status_code)
+                return None
+
+            delay = retry.delay(resp, action)
+            logger.warning("%s %d, retrying in %ss", item_id, resp.status_code, delay)
+            await asyncio.sleep(delay)
+            retries += 1
         
-        logging.error(f"{item_id} failed after {max_retries} retries")
-        return None
+        except (RequestError, TimeoutException) as e:
+            logger.warning("%s exception %s, retrying...", item_id, e)
+            retries += 1
+            await asyncio.sleep(1)
+    
+    logger.error("%s failed after %d retries", item_id, max_retries)
+    return None
 
-async def run_reqs(num_items=1000):
-    limiter = AsyncLimiter(MAX_RPS, 1) 
-    semaphore = asyncio.Semaphore(MAX_CONCURRENT)
-    results = []
+async def run_reqs(rows, num_items=1000):
+    """Fetch orders and put one CSV row per successful fetch on ``rows``."""
+    limiter = TokenBucket(MAX_RPS)
 
-    async with AsyncClient() as client:
-        tasks = [fetch_item(client, i, limiter, semaphore) for i in range(1, num_items+1)]
-        
-        for future in asyncio.as_completed(tasks):
-            data = await future
+    # A fixed pool of MAX_CONCURRENT workers bounds concurrency on its own,
+    # instead of creating a task per item up front and gating it.
+    queue = asyncio.Queue()
+    for i in range(1, num_items + 1):
+        queue.put_nowait(i)
+
+    async def worker(client):
+        while not queue.empty():
+            item_id = queue.get_nowait()
+            data = await fetch_item(client, item_id, limiter)
             if data:
-                row = {field: data.get(field) for field in FIELDS}
-                results.append(row)
-    
-    return results
+                await rows.put(data)
+
+    # One keep-alive connection per worker, so none are opened or dropped mid-run
+    limits = Limits(max_connections=MAX_CONCURRENT, max_keepalive_connections=MAX_CONCURRENT)
+    async with AsyncClient(base_url=BASE_URL, limits=limits) as client:
+        await asyncio.gather(*(worker(client) for _ in range(MAX_CONCURRENT)))
 
 async def write_csv(rows, filename=OUTPUT_FILE):
-    async with aiofiles.open(filename, "w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=FIELDS)
-        await f.write(','.join(FIELDS) + '\n')  
-        
-        for row in rows:
-            line = ','.join(str(row.get(f, "")) for f in FIELDS) + '\n'
-            await f.write(line)
+    """Write rows from the ``rows`` queue until a ``None`` sentinel; return the count."""
+    count = 0
+    async with aiofiles.open(filename, "wb") as f:
+        # Rows are formatted by csv.writer.writerows (C) into one reused buffer,
+        # and whatever is queued (up to WRITE_BATCH rows) goes out in one write
+        # because aiofiles hands every write to a worker thread.
+        buf = io.StringIO()
+        writer = csv.writer(buf, lineterminator='\n')
+        writer.writerow(FIELDS)
+        while True:
+            batch = [await rows.get()]
+            while len(batch) < WRITE_BATCH and not rows.empty():
+                batch.append(rows.get_nowait())
+            done = batch[-1] is None
+            if done:
+                batch.pop()
+
+            writer.writerows(batch)
+            if buf.tell():
+                await f.write(buf.getvalue().encode())
+                buf.seek(0)
+                buf.truncate()
+            count += len(batch)
+
+            if done:
+                return count
 
 async def main():
-    orders = await run_reqs(1000)
-    await write_csv(orders)
-    logging.info(f"Saved {len(orders)} orders to {OUTPUT_FILE}")
+    listener = start_logging()
+    try:
+        # Rows are written while fetching continues; the queue bounds memory
+        rows = asyncio.Queue(maxsize=256)
+
+        async def fetch():
+            await run_reqs(rows, 1000)
+            await rows.put(None)
+
+        writer = asyncio.create_task(write_csv(rows))
+        fetcher = asyncio.create_task(fetch())
+        try:
+            # If either side fails the other would block on the queue forever,
+            # so stop at the first exception and re-raise it
+            done, _ = await asyncio.wait({writer, fetcher}, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+        finally:
+            for task in (writer, fetcher):
+                task.cancel()
+            await asyncio.gather(writer, fetcher, return_exceptions=True)
+        logger.info("Saved %d orders to %s", writer.result(), OUTPUT_FILE)
+    finally:
+        listener.stop()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
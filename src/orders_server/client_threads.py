@@ -1,84 +1,89 @@
 import csv
+import io
 import logging
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 
 import httpx
 from ratelimit import limits, sleep_and_retry
 
+from orders_server import retry
+from orders_server.log import start_logging
+from orders_server.models import FLAT_FIELDS as FIELDS
+
 MAX_RPS = 18  
 MAX_WORKERS = 8 
+BASE_URL = "http://127.0.0.1:8000"
 OUTPUT_FILE = "orders.csv"
-FIELDS = ["order_id","account_id","company","status","currency","subtotal","tax","total","created_at"]
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-)
+logger = logging.getLogger(__name__)
+
+# One pooled client shared by all threads, instead of a new connection per call
+CLIENT = httpx.Client(base_url=BASE_URL, limits=httpx.Limits(max_connections=MAX_WORKERS))
+
+# Fixed set of worker threads kept for the life of the process and reused by run_reqs
+EXECUTOR = ThreadPoolExecutor(MAX_WORKERS, thread_name_prefix="fetch")
+
+@sleep_and_retry
+@limits(calls=MAX_RPS, period=1)
+def limited_get(url):
+    return CLIENT.get(url, timeout=5)
 
 def fetch_item(item_id, max_retries=3):
-    url = f"http://127.0.0.1:8000/item/{item_id}"
+    # Flat form: just the CSV columns as a JSON array, in FIELDS order
+    url = f"/item/{item_id}?flat=1"
     retries = 0
 
     while retries < max_retries:
         try:
-            resp = httpx.get(url, timeout=5)
+            resp = limited_get(url)
             
-            if resp.status_code == 429:
-                retry_after = int(resp.headers.get("Retry-After", 1))
-                logging.warning(f"{item_id} 429, retrying after {retry_after}s")
-                time.sleep(retry_after)
-                retries += 1
-                continue
-            elif 500 <= resp.status_code < 600:  
-                logging.warning(f"{item_id} {resp.status_code}, retrying in 1s")
-                time.sleep(1)
-                retries += 1
-                continue
-            elif 400 <= resp.status_code < 500:
-                logging.error(f"{item_id} {resp.status_code}, non-retryable")
+            action = retry.classify(resp)
+            if action is retry.OK:
+                return item_id, resp.status_code, resp.json()
+            if action is retry.CLIENT_ERROR:
+                logger.error("%s %d, non-retryable", item_id, resp.status_code)
                 return item_id, resp.status_code, None
-            
-            return item_id, resp.status_code, resp.json()
+
+            delay = retry.delay(resp, action)
+            logger.warning("%s %d, retrying in %ss", item_id, resp.status_code, delay)
+            time.sleep(delay)
+            retries += 1
         
         except (httpx.RequestError, httpx.TimeoutException) as e:
-            logging.warning(f"{item_id} exception {e}, retrying...")
+            logger.warning("%s exception %s, retrying...", item_id, e)
             retries += 1
             time.sleep(1)
 
-    logging.error(f"{item_id} failed after {max_retries} retries")
+    logger.error("%s failed after %d retries", item_id, max_retries)
     return item_id, None, None
     
 def run_reqs(num_reqs=50):
     results = []
     item_ids = list(range(1, num_reqs + 1))
 
-    with ThreadPoolExecutor(MAX_WORKERS) as executor:
-        for i in range(0, len(item_ids), MAX_RPS):
-            batch = item_ids[i:i + MAX_RPS]
-            futures = [executor.submit(fetch_item, item_id) for item_id in batch]
-
-            for future in as_completed(futures):
-                item_id, status, data = future.result()
-
-                if status == 200:
-                    row = {field: data.get(field) for field in FIELDS} 
-                    results.append(row)
-                else:
-                    logging.warning(f"Failed to fetch {item_id}: {status}, {data}")
-
-            time.sleep(1)
+    for item_id, status, data in EXECUTOR.map(fetch_item, item_ids):
+        if status == 200:
+            results.append(data)
+        else:
+            logger.warning("Failed to fetch %s: %s, %s", item_id, status, data)
 
     return results
 
 
 if __name__ == "__main__":
-    orders = run_reqs()
-    
-    with open(OUTPUT_FILE, "w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=FIELDS)
-        writer.writeheader()
+    listener = start_logging()
+    try:
+        orders = run_reqs()
+
+        # Format everything in memory with the C writer, then write it in one call
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(FIELDS)
         writer.writerows(orders)
-    
-    logging.info(f"Saved {len(orders)} orders to {OUTPUT_FILE}")
+        with open(OUTPUT_FILE, "w", newline="") as f:
+            f.write(buf.getvalue())
 
+        logger.info("Saved %d orders to %s", len(orders), OUTPUT_FILE)
+    finally:
+        listener.stop()
